@@ -1,140 +1,386 @@
-import pika
-import json
+import aio_pika
+import aiormq
+import asyncio
+import functools
 import logging
-import time
+import os
 import random
+import socket
+import time
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Any, Dict, List, Literal, Optional, Set, Tuple
+
+# Pick the fastest JSON encoder available once, at import time. orjson
+# encodes straight to bytes, which is what a message body wants anyway;
+# ujson and then the stdlib encoder are the optional fallbacks.
+try:
+    from orjson import dumps as _dumps
+except ImportError:
+    try:
+        from ujson import dumps as _ujson_dumps
+
+        def _dumps(obj) -> bytes:
+            return _ujson_dumps(obj).encode('utf-8')
+    except ImportError:
+        import json
+
+        def _dumps(obj) -> bytes:
+            return json.dumps(obj).encode('utf-8')
+
+def _json_fragment(obj) -> bytes:
+    """
+    Encode ``obj`` as JSON, escaped for use inside a bytes %-format template
+    """
+    return _dumps(obj).replace(b'%', b'%%')
+
+# Timestamps only need the date/time part rebuilt when the second changes
+_last_second = -1
+_last_second_prefix = ''
+
+def _format_timestamp(t: float) -> str:
+    """
+    Local ISO 8601 timestamp with millisecond precision for epoch time ``t``
+    """
+    global _last_second, _last_second_prefix
+    second = int(t)
+    if second != _last_second:
+        _last_second_prefix = datetime.fromtimestamp(second).isoformat()
+        _last_second = second
+    return f"{_last_second_prefix}.{int((t - second) * 1000):03d}"
+
+# Number of random categories/ids drawn per refill in generate_news
+_RANDOM_BATCH_SIZE = 1024
+
+class _TCPNoDelayTransportFactory(aiormq.connection.TCPTransportFactory):
+    """
+    TCP transport that sets TCP_NODELAY on every socket it opens
+    """
+    def __init__(self, nodelay: bool):
+        self.nodelay = nodelay
+
+    async def create(self, url, **kwargs):
+        reader, writer = await super().create(url, **kwargs)
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, int(self.nodelay))
+        return reader, writer
+
+class _RobustConnection(aio_pika.RobustConnection):
+    """
+    Robust connection that hands a custom transport factory to aiormq
+    
+    aio-pika turns connect() keyword arguments into URL query parameters, so
+    the factory is injected here and reused for every reconnect.
+    """
+    def __init__(self, url, loop=None, *, transport_factory=None, **kwargs):
+        super().__init__(url, loop=loop, **kwargs)
+        if transport_factory is not None:
+            self.kwargs['transport_factory'] = transport_factory
 
 class NewsPublisher:
-    def __init__(self, host: str = 'localhost', port: int = 5672, max_retries: int = 3):
+    KEYWORDS_MAP = {
+        'Technology': ['innovation', 'tech', 'startup'],
+        'Business': ['market', 'economy', 'investment'],
+        'World': ['global', 'politics', 'international'],
+        'Science': ['research', 'discovery', 'breakthrough']
+    }
+    
+    def __init__(self, host: str = 'localhost', port: int = 5672, max_retries: int = 3,
+                 batch_size: int = 1, retry_delay: float = 3,
+                 keywords_map: Optional[Dict[str, List[str]]] = None,
+                 publisher_confirms: bool = True, max_in_flight: int = 8,
+                 reliability: Literal['best-effort', 'durable'] = 'durable',
+                 tcp_nodelay: Optional[bool] = None, shutdown_timeout: float = 5):
         self.host = host
         self.port = port
         self.max_retries = max_retries
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.publisher_confirms = publisher_confirms
+        self.max_in_flight = max_in_flight
+        self.shutdown_timeout = shutdown_timeout
+        
+        # None keeps asyncio's default (TCP_NODELAY on, lowest latency); False
+        # enables Nagle so the kernel can pack a batch's frames into fewer
+        # segments, which suits large batch_size values
+        self.tcp_nodelay = tcp_nodelay
+        
+        # 'durable' keeps the exchange and messages on disk across broker
+        # restarts; 'best-effort' skips persistence for higher throughput
+        if reliability not in ('best-effort', 'durable'):
+            raise ValueError(f"Unknown reliability mode: {reliability!r}")
+        self.reliability = reliability
+        self.durable = reliability == 'durable'
+        
+        # Categories are the keys of the keyword map; copy it so instances never
+        # share (or mutate) the class-level default
+        if keywords_map is None:
+            keywords_map = self.KEYWORDS_MAP
+        if not keywords_map:
+            raise ValueError("keywords_map must contain at least one category")
+        self.keywords_map = {
+            category: list(keywords) for category, keywords in keywords_map.items()
+        }
+        self.categories = tuple(self.keywords_map)
         self.exchange_name = 'news_exchange'
-        self.connection: Optional[pika.BlockingConnection] = None
-        self.channel = None
+        self.connection: Optional[aio_pika.abc.AbstractConnection] = None
+        self.channel: Optional[aio_pika.abc.AbstractChannel] = None
+        self.exchange: Optional[aio_pika.abc.AbstractExchange] = None
         
-        # Enhanced logging
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            filename='news_publisher.log',
-            filemode='a'
+        # Everything about a news item except its id and timestamp depends only
+        # on the category, so build it once here instead of on every message
+        self._templates_by_category = {
+            category: (
+                f"Breaking News: {category} Breakthrough",
+                f"Latest developments and insights in the {category} sector",
+                tuple(self.keywords_map[category]) + (category.lower(),)
+            )
+            for category in self.categories
+        }
+        # Complete JSON bodies with only the id and timestamp left to fill in,
+        # keeping the key order of generate_news
+        self._body_templates = {
+            category: (
+                b'{"id":%d,"title":' + _json_fragment(title)
+                + b',"content":' + _json_fragment(content)
+                + b',"category":' + _json_fragment(category)
+                + b',"timestamp":"%b","keywords":' + _json_fragment(keywords)
+                + b'}'
+            )
+            for category, (title, content, keywords) in self._templates_by_category.items()
+        }
+        self._routing_keys = {
+            category: f"news.{category.lower()}" for category in self.categories
+        }
+        # aiormq writes a message_id into the properties it is given, so each
+        # publish needs its own object; binding the constant fields here keeps
+        # that to a single constructor call
+        self._new_properties = functools.partial(
+            aiormq.spec.Basic.Properties,
+            delivery_mode=int(
+                aio_pika.DeliveryMode.PERSISTENT if self.durable
+                else aio_pika.DeliveryMode.NOT_PERSISTENT
+            ),
+            content_type='application/json'
         )
+        
+        # Random draws are made in bulk and consumed one per news item
+        self._rng = random.Random()
+        self._category_batch: List[str] = []
+        self._id_batch: List[int] = []
+        
         self.logger = logging.getLogger(__name__)
 
-    def connect(self):
+    async def connect(self):
         """
         Robust connection to RabbitMQ with retry mechanism
         """
         for attempt in range(self.max_retries):
             try:
-                self.logger.info(f"Connecting to RabbitMQ (Attempt {attempt + 1})")
+                self.logger.info("Connecting to RabbitMQ (Attempt %d)", attempt + 1)
                 
-                # Enhanced connection parameters
-                connection_params = pika.ConnectionParameters(
-                    host=self.host, 
+                # A robust connection re-establishes itself in the background
+                # and restores its channel and exchange, so only this first
+                # connect needs the retry loop
+                connection_class = aio_pika.RobustConnection
+                if self.tcp_nodelay is not None:
+                    connection_class = functools.partial(
+                        _RobustConnection,
+                        transport_factory=_TCPNoDelayTransportFactory(self.tcp_nodelay)
+                    )
+                self.connection = await aio_pika.connect_robust(
+                    host=self.host,
                     port=self.port,
-                    connection_attempts=self.max_retries,
-                    retry_delay=3
+                    reconnect_interval=self.retry_delay,
+                    connection_class=connection_class
                 )
                 
-                self.connection = pika.BlockingConnection(connection_params)
-                self.channel = self.connection.channel()
+                # Publisher confirms are handled asynchronously: each publish
+                # resolves when its basic.ack arrives, so many can be in flight
+                self.channel = await self.connection.channel(
+                    publisher_confirms=self.publisher_confirms
+                )
                 
-                # Exchange declaration with more robust settings
-                self.channel.exchange_declare(
-                    exchange=self.exchange_name,
-                    exchange_type='topic',
-                    durable=True,
+                # Exchange declaration with more robust settings. Publishing goes
+                # through the underlying aiormq channel by exchange_name; the
+                # declared exchange is kept so the robust channel re-declares
+                # it after a reconnect
+                self.exchange = await self.channel.declare_exchange(
+                    self.exchange_name,
+                    aio_pika.ExchangeType.TOPIC,
+                    durable=self.durable,
                     auto_delete=False
                 )
                 
-                self.logger.info(f"Successfully connected and declared exchange '{self.exchange_name}'")
+                self.logger.info("Successfully connected and declared exchange '%s'", self.exchange_name)
                 return True
             
             except Exception as e:
-                self.logger.warning(f"Connection attempt {attempt + 1} failed: {e}")
-                time.sleep(3)
+                self.logger.warning("Connection attempt %d failed: %s", attempt + 1, e)
+                # A robust connection that opened but failed later (e.g. a
+                # PRECONDITION_FAILED declare) would keep reconnecting forever
+                await self._discard_connection()
+                await asyncio.sleep(self.retry_delay)
         
         self.logger.error("Failed to connect to RabbitMQ after multiple attempts")
         return False
 
-    def generate_news(self) -> Dict[str, str]:
+    async def _discard_connection(self):
+        """
+        Close and forget the connection left over from a failed connect attempt
+        """
+        connection, self.connection = self.connection, None
+        self.channel = None
+        self.exchange = None
+        if connection is not None and not connection.is_closed:
+            try:
+                await connection.close()
+            except Exception as e:
+                self.logger.warning("Closing failed connection raised: %s", e)
+
+    def _draw_news(self) -> Tuple[str, int]:
+        """
+        Draw the category and id, the random fields of a news item
+        """
+        if not self._id_batch:
+            self._refill_random_batches()
+        return self._category_batch.pop(), self._id_batch.pop()
+
+    def generate_news(self) -> Dict[str, Any]:
         """
         Enhanced news generation with more comprehensive data
         """
-        categories = ['Technology', 'Business', 'World', 'Science']
-        category = random.choice(categories)
-        
-        keywords_map = {
-            'Technology': ['innovation', 'tech', 'startup'],
-            'Business': ['market', 'economy', 'investment'],
-            'World': ['global', 'politics', 'international'],
-            'Science': ['research', 'discovery', 'breakthrough']
-        }
+        category, news_id = self._draw_news()
+        title, content, keywords = self._templates_by_category[category]
         
         return {
-            "id": random.randint(1000, 9999),
-            "title": f"Breaking News: {category} Breakthrough",
-            "content": f"Latest developments and insights in the {category} sector",
+            "id": news_id,
+            "title": title,
+            "content": content,
             "category": category,
-            "timestamp": datetime.now().isoformat(),
-            "keywords": keywords_map.get(category, []) + [category.lower()]
+            "timestamp": _format_timestamp(time.time()),
+            "keywords": keywords
         }
 
-    def publish_news(self):
+    def _encode_news(self, category: str, news_id: int, timestamp: bytes) -> bytes:
         """
-        Advanced news publishing with enhanced error handling
+        JSON body for a news item, equivalent to encoding ``generate_news()``
+        """
+        return self._body_templates[category] % (news_id, timestamp)
+
+    def _refill_random_batches(self):
+        """
+        Draw the next ``_RANDOM_BATCH_SIZE`` categories and ids in one call each
+        """
+        self._category_batch = self._rng.choices(self.categories, k=_RANDOM_BATCH_SIZE)
+        # Ids are 16-bit values from one urandom read, folded into 1000-9999
+        id_bits = memoryview(os.urandom(2 * _RANDOM_BATCH_SIZE)).cast('H')
+        self._id_batch = [1000 + bits % 9000 for bits in id_bits]
+
+    async def publish_news(self):
+        """
+        Publish a batch of ``batch_size`` news items and await their confirms together
+        
+        Reuses the robust connection opened by ``start_publishing``. While it is
+        reconnecting, the batch waits until the channel has been restored; a
+        batch already sent when the connection drops is logged as failed.
         """
         try:
-            # Ensure connection exists
-            if not self.connection or self.connection.is_closed:
-                if not self.connect():
-                    return
+            # A batch is generated all at once, so one clock read dates it
+            timestamp = _format_timestamp(time.time()).encode('ascii')
+            news_items = [self._draw_news() for _ in range(self.batch_size)]
             
-            news_item = self.generate_news()
-            routing_key = f"news.{news_item['category'].lower()}"
+            bodies = [
+                self._encode_news(category, news_id, timestamp)
+                for category, news_id in news_items
+            ]
             
-            try:
-                self.channel.basic_publish(
-                    exchange=self.exchange_name,
-                    routing_key=routing_key,
-                    body=json.dumps(news_item),
-                    properties=pika.BasicProperties(
-                        delivery_mode=2,  # Persistent
-                        content_type='application/json'
+            # Queue the frames of the whole batch without waiting for each one
+            # to drain, so the connection's writer sends them back to back and
+            # only the confirms are awaited
+            # The connection is marked ready before its channels are reopened,
+            # so wait for the channel itself rather than just the connection
+            await self.channel.ready()
+            channel = await self.channel.get_underlay_channel()
+            results = await asyncio.gather(
+                *(
+                    channel.basic_publish(
+                        body,
+                        exchange=self.exchange_name,
+                        routing_key=self._routing_keys[news_item[0]],
+                        properties=self._new_properties(),
+                        mandatory=False,
+                        wait=False
                     )
-                )
-                self.logger.info(f"Published: {news_item['title']}")
+                    for news_item, body in zip(news_items, bodies)
+                ),
+                return_exceptions=True
+            )
             
-            except Exception as publish_error:
-                self.logger.error(f"Publish failed: {publish_error}")
+            for news_item, result in zip(news_items, results):
+                if isinstance(result, Exception):
+                    self.logger.error("Publish failed: %s", result)
+                else:
+                    self.logger.info("Published: %s", self._templates_by_category[news_item[0]][0])
         
         except Exception as e:
-            self.logger.error(f"Unexpected error in publishing: {e}")
+            self.logger.error("Unexpected error in publishing: %s", e)
 
-    def start_publishing(self, interval: int = 5):
+    async def start_publishing(self, interval: int = 5):
         """
-        Robust continuous publishing mechanism
+        Publish a batch every ``interval`` seconds at a fixed rate
+        
+        Each batch runs as its own task, so a slow publish or confirm does not
+        push back the next tick. At most ``max_in_flight`` batches are pending;
+        ticks missed while waiting on that limit are dropped.
         """
         self.logger.info("Starting news publishing...")
+        if not await self.connect():
+            return
+        loop = asyncio.get_running_loop()
+        in_flight: Set[asyncio.Task] = set()
+        next_tick = loop.time()
         try:
             while True:
-                self.publish_news()
-                time.sleep(interval)
+                if len(in_flight) >= self.max_in_flight:
+                    await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                task = asyncio.create_task(self.publish_news())
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+                
+                # Ticks missed while blocked on max_in_flight are skipped, not
+                # fired in a burst once the stall clears
+                next_tick = max(next_tick + interval, loop.time())
+                await asyncio.sleep(next_tick - loop.time())
         
-        except KeyboardInterrupt:
+        except asyncio.CancelledError:
             self.logger.info("Publishing stopped by user.")
+            raise
         finally:
+            # Give batches already sent up to shutdown_timeout to collect their
+            # confirms, then cancel the rest so a stuck publish cannot block exit
+            if in_flight:
+                _, pending = await asyncio.wait(in_flight, timeout=self.shutdown_timeout)
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
             if self.connection and not self.connection.is_closed:
-                self.connection.close()
+                await self.connection.close()
                 self.logger.info("Connection safely closed.")
 
 def main():
+    # Logging is configured by the entry point rather than per publisher
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        filename='news_publisher.log',
+        filemode='a'
+    )
     publisher = NewsPublisher()
-    publisher.start_publishing(interval=5)
+    try:
+        asyncio.run(publisher.start_publishing(interval=5))
+    except KeyboardInterrupt:
+        pass
 
 if __name__ == "__main__":
     main()
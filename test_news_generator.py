@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from news_generator import NewsPublisher
+
+
+def _generate(publisher, category, news_id):
+    """
+    Force generate_news to produce an item for ``category`` with ``news_id``
+    """
+    publisher._category_batch = [category]
+    publisher._id_batch = [news_id]
+    item = publisher.generate_news()
+    item["keywords"] = list(item["keywords"])
+    return item
+
+
+@pytest.mark.parametrize("keywords_map", [
+    None,
+    {
+        'Te%st "quoted" 100%': ['a%b', '%d', '%%', 'back\\slash'],
+        'Ünïcødé 新闻': ['ümlaut', '日本'],
+        'Empty': []
+    }
+])
+def test_encoded_body_matches_generate_news(keywords_map):
+    publisher = NewsPublisher(keywords_map=keywords_map)
+    for news_id, category in enumerate(publisher.categories, start=1000):
+        expected = _generate(publisher, category, news_id)
+        body = publisher._encode_news(category, news_id, expected["timestamp"].encode('ascii'))
+        decoded = json.loads(body)
+        assert decoded == expected
+        assert list(decoded) == list(expected)